@@ -0,0 +1,78 @@
+"""Semantic response cache for paraphrased chat questions."""
+from __future__ import annotations
+
+from collections import OrderedDict
+from itertools import count
+from threading import RLock
+from typing import Any, Dict, List, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from backend.app.models import ChatMessage
+
+GLOBAL_BUCKET = "__global__"
+
+
+class Embedder(Protocol):
+    def embed(self, texts: Sequence[str]) -> Any: ...
+
+
+class SemanticCache:
+    """Bounded LRU of (embedding, ChatMessage) pairs, bucketed per session.
+
+    Any embedder with ``embed(texts)`` works (``DenseEmbedder`` or ``RetrievalPipeline``);
+    vectors are L2-normalized on the way in, so cosine similarity is a single
+    ``matrix @ embedding`` over the bucket's stacked vectors.
+    """
+
+    def __init__(self, embedder: Embedder, threshold: float = 0.87, max_entries: int = 512) -> None:
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[str, np.ndarray, ChatMessage]]" = OrderedDict()
+        self._buckets: Dict[str, List[int]] = {}
+        self._matrices: Dict[str, np.ndarray] = {}
+        self._ids = count()
+        self._lock = RLock()
+
+    def embed(self, text: str) -> np.ndarray:
+        embedding = np.asarray(self.embedder.embed([text])[0], dtype=np.float32)
+        return embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+
+    def lookup(self, bucket: str, embedding: np.ndarray) -> ChatMessage | None:
+        with self._lock:
+            entry_ids = self._buckets.get(bucket)
+            if not entry_ids:
+                return None
+            matrix = self._matrix(bucket, entry_ids)
+            scores = matrix @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            entry_id = entry_ids[best]
+            self._entries.move_to_end(entry_id)
+            return self._entries[entry_id][2]
+
+    def store(self, bucket: str, embedding: np.ndarray, message: ChatMessage) -> None:
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (bucket, embedding, message)
+            self._buckets.setdefault(bucket, []).append(entry_id)
+            self._matrices.pop(bucket, None)
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def _matrix(self, bucket: str, entry_ids: List[int]) -> np.ndarray:
+        matrix = self._matrices.get(bucket)
+        if matrix is None:
+            matrix = np.stack([self._entries[entry_id][1] for entry_id in entry_ids])
+            self._matrices[bucket] = matrix
+        return matrix
+
+    def _evict_oldest(self) -> None:
+        entry_id, (bucket, _, _) = self._entries.popitem(last=False)
+        entry_ids = self._buckets[bucket]
+        entry_ids.remove(entry_id)
+        self._matrices.pop(bucket, None)
+        if not entry_ids:
+            del self._buckets[bucket]
@@ -1,23 +1,131 @@
 """Conversation memory backed by Supabase."""
 from __future__ import annotations
 
-from typing import List
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import List, Sequence, Tuple
 from threading import RLock
 
-from backend.database.clients import db_clients
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 
-_local_memory_store: dict[str, List[dict[str, str]]] = {}
+from supabase import Client
+
+from backend.database.clients import db_clients, is_connection_error
+
+# session_id -> (roles, contents): parallel lists instead of one dict per message.
+_local_memory_store: dict[str, Tuple[List[str], List[str]]] = {}
+_known_conversations: "OrderedDict[str, None]" = OrderedDict()
+_history_cache: "OrderedDict[str, Tuple[float, List[dict[str, str]]]]" = OrderedDict()
+# session_id -> (summary text, marker of the newest message it covers)
+_summaries: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
 _store_lock = RLock()
 
+HISTORY_CACHE_TTL = 30.0
+HISTORY_CACHE_MAX_SESSIONS = 10_000
+# Refresh a rolling summary only once this many dropped messages are newer than it.
+SUMMARY_REFRESH_MESSAGES = 6
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model("gpt-3.5-turbo")
+    except Exception:
+        # BPE files unavailable (e.g. offline); fall back to the character heuristic.
+        return None
+
+
+def warm_up() -> None:
+    """Load the tokenizer up front; tiktoken downloads its BPE file on first use."""
+    _encoding()
+
+
+@lru_cache(maxsize=8192)
+def token_len(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def _summary_marker(message: dict) -> str:
+    return f"{message['role']}:{message['content']}"
+
 
 class ConversationMemory:
-    def __init__(self, window: int = 6) -> None:
+    def __init__(self, window: int = 20, token_budget: int = 2048) -> None:
         self.window = window
+        self.token_budget = token_budget
 
     def fetch(self, session_id: str) -> List[dict]:
+        cached = self._fetch_cached(session_id)
+        if cached is not None:
+            return cached
+        history = self._fetch_remote(session_id)
+        self._store_cached(session_id, history)
+        return list(history)
+
+    def fit_budget(self, history: List[dict]) -> Tuple[List[dict], List[dict]]:
+        """Split history into ``(dropped, kept)`` so ``kept`` fits within ``token_budget``.
+
+        Starts from the full history and drops from the oldest end, so the common case
+        (everything fits) costs one tokenization pass.
+        """
+        lengths = [token_len(item["content"]) for item in history]
+        total = sum(lengths)
+        start = 0
+        while start < len(history) and total > self.token_budget:
+            total -= lengths[start]
+            start += 1
+        return history[:start], history[start:]
+
+    def summary(self, session_id: str) -> str | None:
+        with _store_lock:
+            entry = _summaries.get(session_id)
+            return entry[0] if entry else None
+
+    def needs_summary(self, session_id: str, dropped: List[dict]) -> bool:
+        """True once ``SUMMARY_REFRESH_MESSAGES`` dropped messages are newer than the summary.
+
+        Past the budget the window slides every turn, so comparing against the newest dropped
+        message alone would re-summarize on nearly every request.
+        """
+        if not dropped:
+            return False
+        with _store_lock:
+            entry = _summaries.get(session_id)
+        if entry is None:
+            return True
+        markers = [_summary_marker(message) for message in reversed(dropped)]
+        try:
+            # Messages after the newest one the summary covers.
+            behind = markers.index(entry[1])
+        except ValueError:
+            # The summarized message has slid out of the fetched window entirely.
+            behind = len(markers)
+        return behind >= SUMMARY_REFRESH_MESSAGES
+
+    def store_summary(self, session_id: str, summary: str, dropped: List[dict]) -> None:
+        with _store_lock:
+            _summaries[session_id] = (summary, _summary_marker(dropped[-1]))
+            _summaries.move_to_end(session_id)
+            while len(_summaries) > HISTORY_CACHE_MAX_SESSIONS:
+                _summaries.popitem(last=False)
+
+    def _fetch_remote(self, session_id: str) -> List[dict]:
+        client = None
         try:
+            client = db_clients.supabase
             response = (
-                db_clients.supabase.table("messages")
+                client.table("messages")
                 .select("role, content")
                 .eq("conversation_id", session_id)
                 .order("created_at", desc=True)
@@ -25,36 +133,101 @@ class ConversationMemory:
                 .execute()
             )
             return list(reversed(response.data))
-        except Exception:
+        except Exception as exc:
+            self._reset_on_connection_error(exc, client)
             return self._fetch_local(session_id)
 
     def append(self, session_id: str, role: str, content: str) -> None:
-        payload = {
-            "conversation_id": session_id,
-            "role": role,
-            "content": content,
-        }
+        self.append_many(session_id, [(role, content)])
+
+    def append_many(self, session_id: str, messages: Sequence[Tuple[str, str]]) -> None:
+        """Persist several messages for one session in a single insert round-trip."""
+        # Rows inserted together share the transaction's now(); stamp them client-side
+        # so ordering by created_at still reflects the order they were given in.
+        base = datetime.now(timezone.utc)
+        payloads = [
+            {
+                "conversation_id": session_id,
+                "role": role,
+                "content": content,
+                "created_at": (base + timedelta(microseconds=offset)).isoformat(),
+            }
+            for offset, (role, content) in enumerate(messages)
+        ]
+        self._extend_cached(session_id, payloads)
+        client = None
         try:
-            self._ensure_conversation(session_id)
-            db_clients.supabase.table("messages").insert(payload).execute()
-        except Exception:
-            self._append_local(session_id, payload)
+            client = db_clients.supabase
+            self._ensure_conversation(client, session_id)
+            client.table("messages").insert(payloads).execute()
+        except Exception as exc:
+            self._reset_on_connection_error(exc, client)
+            for payload in payloads:
+                self._append_local(session_id, payload)
 
-    def _ensure_conversation(self, session_id: str) -> None:
+    def _ensure_conversation(self, client: Client, session_id: str) -> None:
+        with _store_lock:
+            if session_id in _known_conversations:
+                _known_conversations.move_to_end(session_id)
+                return
         try:
-            db_clients.supabase.table("conversations").upsert({"id": session_id}).execute()
+            client.table("conversations").upsert({"id": session_id}).execute()
+            with _store_lock:
+                _known_conversations[session_id] = None
+                while len(_known_conversations) > HISTORY_CACHE_MAX_SESSIONS:
+                    _known_conversations.popitem(last=False)
         except Exception:
             # Conversation table missing or Supabase unavailable; local store needs no setup.
             pass
 
+    def _reset_on_connection_error(self, exc: Exception, client: Client | None) -> None:
+        # Only the client that failed is replaced; another thread may already have rebuilt it.
+        if client is not None and is_connection_error(exc):
+            db_clients.force_reconnect(client)
+
+    def _fetch_cached(self, session_id: str) -> List[dict] | None:
+        with _store_lock:
+            entry = _history_cache.get(session_id)
+            if entry is None:
+                return None
+            stored_at, history = entry
+            if time.monotonic() - stored_at > HISTORY_CACHE_TTL:
+                del _history_cache[session_id]
+                return None
+            _history_cache.move_to_end(session_id)
+            return list(history)
+
+    def _store_cached(self, session_id: str, history: List[dict]) -> None:
+        with _store_lock:
+            _history_cache[session_id] = (time.monotonic(), list(history[-self.window :]))
+            _history_cache.move_to_end(session_id)
+            while len(_history_cache) > HISTORY_CACHE_MAX_SESSIONS:
+                _history_cache.popitem(last=False)
+
+    def _extend_cached(self, session_id: str, payloads: List[dict]) -> None:
+        # Only sessions already cached are updated; an uncached session may have older
+        # history in Supabase that the next fetch must load.
+        with _store_lock:
+            entry = _history_cache.get(session_id)
+            if entry is None:
+                return
+            history = entry[1]
+            history.extend({"role": payload["role"], "content": payload["content"]} for payload in payloads)
+            del history[: -self.window]
+
     def _fetch_local(self, session_id: str) -> List[dict]:
         with _store_lock:
-            history = _local_memory_store.get(session_id, [])
-            if not history:
+            entry = _local_memory_store.get(session_id)
+            if entry is None:
                 return []
-            return history[-self.window :]
+            roles, contents = entry
+            return [
+                {"role": role, "content": content}
+                for role, content in zip(roles[-self.window :], contents[-self.window :])
+            ]
 
     def _append_local(self, session_id: str, payload: dict[str, str]) -> None:
         with _store_lock:
-            entries = _local_memory_store.setdefault(session_id, [])
-            entries.append({"role": payload["role"], "content": payload["content"]})
+            roles, contents = _local_memory_store.setdefault(session_id, ([], []))
+            roles.append(sys.intern(payload["role"]))
+            contents.append(payload["content"])
@@ -7,16 +7,14 @@ from langchain_core.language_models import BaseLanguageModel
 from backend.app.models import ChatRequest
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ModelRouter:
     primary: BaseLanguageModel
     fast: BaseLanguageModel
     extractor: BaseLanguageModel
 
     def pick(self, request: ChatRequest) -> BaseLanguageModel:
-        metadata = request.metadata or {}
-        if metadata.get("mode") == "extract" or metadata.get("requires_part_numbers"):
+        metadata = request.metadata
+        if metadata and (metadata.get("mode") == "extract" or metadata.get("requires_part_numbers")):
             return self.extractor
-        if len(request.message) < 320:
-            return self.fast
-        return self.primary
+        return self.fast if len(request.message) < 320 else self.primary
@@ -2,31 +2,88 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import json
 import logging
-from dataclasses import dataclass
-from textwrap import dedent
-from typing import Any, List
-from urllib.parse import urlparse
-
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema import AIMessage, HumanMessage, SystemMessage
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, AsyncIterator, List, Tuple
+
+from langchain_core.language_models import BaseLanguageModel
+from langchain.schema import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from backend.agent.cache import GLOBAL_BUCKET, SemanticCache
 from backend.agent.memory import ConversationMemory
 from backend.agent.model_router import ModelRouter
 from backend.agent.prompts import RESPONSE_TEMPLATE, SYSTEM_PROMPT
-from backend.app.models import ChatMessage, ChatRequest
-from backend.rag.pipeline import RetrievalPipeline
+from backend.app.models import ChatMessage, ChatRequest, ToolCall, utcnow
+from backend.rag.pipeline import RetrievalPipeline, RetrievalResult
 from backend.tools.router import ToolRouter
 
 
 logger = logging.getLogger(__name__)
 
+# Strong references to fire-and-forget tasks so they are not garbage-collected mid-flight.
+_background_tasks: set[asyncio.Task] = set()
 
-@dataclass
+SEARCH_HEURISTICS = ("error code", "recall", "price", "warranty", "meaning", "news")
+# One alternation scans the message once instead of one substring search per keyword.
+_SEARCH_HEURISTICS_RE = re.compile("|".join(re.escape(term) for term in SEARCH_HEURISTICS))
+SEARCH_VERDICT_CACHE_SIZE = 4096
+# Request metadata that changes the model or tool path, and so scopes semantic-cache buckets.
+CACHE_ROUTING_KEYS = ("mode", "requires_part_numbers", "requires_search")
+
+
+async def flush_background_tasks() -> None:
+    """Wait for pending fire-and-forget work (memory writes, summaries) to finish."""
+    if _background_tasks:
+        logger.info(f"Flushing {len(_background_tasks)} background tasks")
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+
+
+def _normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question.strip().lower())
+
+
+def _url_host(link: str) -> str:
+    """Netloc of an absolute URL without the cost of a full ``urlparse``."""
+    if "://" not in link:
+        return "unknown"
+    host = link.split("/", 3)[2].partition("?")[0].partition("#")[0]
+    return host or "unknown"
+
+
+@lru_cache(maxsize=4096)
+def _heuristic_search(normalized: str) -> bool:
+    return _SEARCH_HEURISTICS_RE.search(normalized) is not None
+
+
+class _LeaderCancelled(Exception):
+    """Set on a coalesced future when the request that owned the pipeline run was cancelled."""
+
+
+@dataclass(slots=True, frozen=True)
 class AgentContext:
     model_router: ModelRouter
     retrieval_pipeline: RetrievalPipeline | None
     tools: ToolRouter
     memory: ConversationMemory
+    semantic_cache: SemanticCache | None = None
+
+
+@dataclass
+class _PreparedTurn:
+    """Everything ``run``/``stream`` need once the prompt is built (or a cache hit)."""
+
+    session_id: str
+    cached: ChatMessage | None = None
+    prompt_messages: List[BaseMessage] = field(default_factory=list)
+    model: BaseLanguageModel | None = None
+    retrieved_chunks: List[RetrievalResult] = field(default_factory=list)
+    tool_events: List[ToolCall] = field(default_factory=list)
+    cache_bucket: str | None = None
+    query_embedding: Any = None
 
 
 class AgentOrchestrator:
@@ -34,75 +91,263 @@ class AgentOrchestrator:
 
     def __init__(self, context: AgentContext) -> None:
         self.context = context
-        self.prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", SYSTEM_PROMPT),
-                ("human", RESPONSE_TEMPLATE),
-            ]
-        )
+        self._search_verdicts: "OrderedDict[str, bool]" = OrderedDict()
+        self._inflight: dict[str, asyncio.Future[ChatMessage]] = {}
+        # The system prompt never changes and the human turn only needs plain substitution,
+        # so skip LangChain's template parsing/validation on every request.
+        self._system_message = SystemMessage(content=SYSTEM_PROMPT)
 
     async def run(self, request: ChatRequest) -> ChatMessage:
+        # Identical questions already in flight for the same session (double submits,
+        # client retries) share one pipeline run instead of stampeding retrieval and the LLM.
+        # The key includes the session because the prompt carries that session's history.
+        key = self._inflight_key(request)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            logger.info(f"Coalescing duplicate in-flight request session_id={request.session_id}")
+            try:
+                shared = await asyncio.shield(pending)
+            except _LeaderCancelled:
+                # The leader's client went away; its cancellation is not ours, so run again.
+                return await self.run(request)
+            self._remember(request.session_id or "temp", request.message, shared.content)
+            return shared.model_copy(update={"created_at": utcnow()})
+
+        future: asyncio.Future[ChatMessage] = asyncio.get_running_loop().create_future()
+        # Mark failures as retrieved so an unawaited future does not log "exception never retrieved".
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._inflight[key] = future
+        try:
+            message = await self._run(request)
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(message)
+            return message
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _run(self, request: ChatRequest) -> ChatMessage:
+        turn = await self._prepare(request)
+        if turn.cached is not None:
+            return turn.cached
+
+        logger.info(f"Invoking LLM model: {type(turn.model).__name__}")
+        response = await turn.model.ainvoke(turn.prompt_messages)
+        logger.info("LLM invocation complete")
+        return self._finish(request, turn, response.content)
+
+    async def stream(self, request: ChatRequest) -> AsyncIterator[str | ChatMessage]:
+        """Yield response text deltas as the model produces them, then the final ``ChatMessage``."""
+        turn = await self._prepare(request)
+        if turn.cached is not None:
+            yield turn.cached.content
+            yield turn.cached
+            return
+
+        logger.info(f"Streaming LLM model: {type(turn.model).__name__}")
+        parts: List[str] = []
+        try:
+            async for chunk in turn.model.astream(turn.prompt_messages):
+                delta = getattr(chunk, "content", str(chunk))
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except (GeneratorExit, asyncio.CancelledError):
+            # The client went away mid-answer: keep what it was shown, but never cache a
+            # partial answer. A model failure records nothing, as in run().
+            logger.info("LLM stream interrupted by client; recording partial answer")
+            self._remember(turn.session_id, request.message, "".join(parts))
+            raise
+        logger.info("LLM stream complete")
+        yield self._finish(request, turn, "".join(parts))
+
+    async def _prepare(self, request: ChatRequest) -> _PreparedTurn:
+        """Run every step up to the LLM call: cache lookup, history, retrieval, and search."""
         logger.info(f"Processing chat request session_id={request.session_id}")
         session_id = request.session_id or "temp"
-        history = self.context.memory.fetch(session_id)
-        history_str = self._format_history(history)
-
         metadata = dict(request.metadata or {})
 
-        # 1. Start Retrieval
-        if self.context.retrieval_pipeline:
-            logger.info("Starting retrieval pipeline")
-            retrieved_chunks = await self.context.retrieval_pipeline.retrieve(query=request.message)
-            logger.info(f"Retrieval complete. Found {len(retrieved_chunks)} chunks")
-        else:
-            logger.info("Retrieval pipeline skipped (not configured)")
+        # 0. Semantic cache: paraphrases of an earlier question skip RAG + LLM entirely
+        cache_bucket = self._cache_bucket(session_id, request, metadata)
+        query_embedding = None
+        if cache_bucket is not None:
+            query_embedding = await asyncio.to_thread(self.context.semantic_cache.embed, request.message)
+            cached = self.context.semantic_cache.lookup(cache_bucket, query_embedding)
+            if cached is not None:
+                logger.info(f"Semantic cache hit session_id={session_id}")
+                message = cached.model_copy(update={"created_at": utcnow()})
+                self._remember(session_id, request.message, message.content)
+                return _PreparedTurn(session_id=session_id, cached=message)
+
+        # 1. Fetch history, run retrieval, and classify the question concurrently.
+        # The classifier result only matters when retrieval finds manuals, but running it
+        # speculatively hides its latency behind retrieval. When search is already certain
+        # (explicit request or keyword hit), start it now instead of classifying.
+        search_requested = bool(metadata.get("requires_search", False))
+        search_task = None
+        if search_requested or _heuristic_search(_normalize_question(request.message)):
+            search_task = asyncio.create_task(self._web_search(request.message))
+        # Without a retrieval pipeline search is always forced, so the classifier is moot.
+        classify = search_task is None and self.context.retrieval_pipeline is not None
+        budgeted, retrieved_chunks, classifier_hit = await asyncio.gather(
+            asyncio.to_thread(self._load_history, session_id),
+            self._retrieve(request.message),
+            self._should_search(request.message) if classify else asyncio.sleep(0, result=False),
+            return_exceptions=True,
+        )
+        if isinstance(budgeted, BaseException):
+            logger.warning(f"History fetch failed: {budgeted}")
+            budgeted = ([], [])
+        if isinstance(retrieved_chunks, BaseException):
+            logger.warning(f"Retrieval failed: {retrieved_chunks}")
             retrieved_chunks = []
+        if isinstance(classifier_hit, BaseException):
+            classifier_hit = False
+        history = self._budget_history(session_id, *budgeted)
+        history_str = self._format_history(history)
 
         # 2. Check if we need web search (Fallback Logic)
-        should_search = metadata.get("requires_search", False)
-        
+        should_search = search_task is not None
+
         # FALLBACK: If no manuals found, force web search
-        if not retrieved_chunks: 
+        if not retrieved_chunks:
             logger.info("No manuals found, defaulting to web search")
             should_search = True
-        elif await self._should_search(request.message): # Or if the question inherently needs web (e.g. "price")
+        elif classifier_hit:  # Or if the question inherently needs web (e.g. "price")
             logger.info("Query classifier triggered web search")
             should_search = True
 
-        # 3. Execute Search if needed
+        # 3. Execute Search if needed (or collect the one started speculatively)
         tool_events = []
-        if should_search:
-            # Route to search tool
-            logger.info("Executing tool routing for search")
-            tool_events = await self.context.tools.route(message=request.message, metadata={"requires_search": True})
-            logger.info(f"Tool execution complete. Events: {len(tool_events)}")
+        if search_task is not None:
+            tool_events = await search_task
+        elif should_search:
+            tool_events = await self._web_search(request.message)
 
         # 4. Format Context (Combine Manuals + Web)
         context_block = self._format_context(retrieved_chunks, tool_events)
 
-        prompt_messages = self.prompt.format_messages(
-            context=context_block,
-            history=history_str,
-            question=request.message,
-        )
+        prompt_messages = self._build_prompt(context_block, history_str, request.message)
 
-        model = self.context.model_router.pick(request)
-        logger.info(f"Invoking LLM model: {type(model).__name__}")
-        response = await model.ainvoke(prompt_messages)
-        logger.info("LLM invocation complete")
+        return _PreparedTurn(
+            session_id=session_id,
+            prompt_messages=prompt_messages,
+            model=self.context.model_router.pick(request),
+            retrieved_chunks=retrieved_chunks,
+            tool_events=tool_events,
+            cache_bucket=cache_bucket,
+            query_embedding=query_embedding,
+        )
 
+    def _finish(self, request: ChatRequest, turn: _PreparedTurn, content: str) -> ChatMessage:
         message = ChatMessage(
             role="assistant",
-            content=response.content,
-            citations=[chunk.to_model() for chunk in retrieved_chunks],
-            tool_calls=tool_events,
+            content=content,
+            citations=[chunk.to_model() for chunk in turn.retrieved_chunks],
+            tool_calls=turn.tool_events,
         )
 
-        self.context.memory.append(session_id, "user", request.message)
-        self.context.memory.append(session_id, "assistant", response.content)
+        if turn.query_embedding is not None:
+            self.context.semantic_cache.store(turn.cache_bucket, turn.query_embedding, message)
+
+        self._remember(turn.session_id, request.message, content)
 
         return message
 
+    def _build_prompt(self, context_block: str, history_str: str, question: str) -> List[BaseMessage]:
+        return [
+            self._system_message,
+            HumanMessage(
+                content=RESPONSE_TEMPLATE.format(context=context_block, history=history_str, question=question)
+            ),
+        ]
+
+    async def _web_search(self, message: str) -> List[ToolCall]:
+        logger.info("Executing tool routing for search")
+        tool_events = await self.context.tools.route(message=message, metadata={"requires_search": True})
+        logger.info(f"Tool execution complete. Events: {len(tool_events)}")
+        return tool_events
+
+    async def _retrieve(self, query: str) -> List[RetrievalResult]:
+        if not self.context.retrieval_pipeline:
+            logger.info("Retrieval pipeline skipped (not configured)")
+            return []
+        logger.info("Starting retrieval pipeline")
+        retrieved_chunks = await self.context.retrieval_pipeline.retrieve(query=query)
+        logger.info(f"Retrieval complete. Found {len(retrieved_chunks)} chunks")
+        return retrieved_chunks
+
+    def _remember(self, session_id: str, question: str, answer: str) -> None:
+        """Persist the exchange in the background so Supabase RTTs stay off the response path."""
+        messages = [("user", question), ("assistant", answer)] if answer else [("user", question)]
+        self._spawn(asyncio.to_thread(self.context.memory.append_many, session_id, messages))
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    def _inflight_key(self, request: ChatRequest) -> str:
+        metadata = json.dumps(request.metadata or {}, sort_keys=True, default=str)
+        raw = f"{request.session_id or 'temp'}|{request.message}|{metadata}|{','.join(request.image_ids)}"
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _cache_bucket(self, session_id: str, request: ChatRequest, metadata: dict) -> str | None:
+        """Pick the semantic-cache bucket for a request, or ``None`` to bypass the cache."""
+        if self.context.semantic_cache is None or request.image_ids:
+            return None
+        if metadata.get("semantic_cache") is False:
+            return None
+        bucket = GLOBAL_BUCKET if metadata.get("cache_scope") == "global" else session_id
+        # Answers produced on another model or tool path must not satisfy this request.
+        routing = {key: metadata[key] for key in CACHE_ROUTING_KEYS if metadata.get(key)}
+        if routing:
+            bucket = f"{bucket}|{json.dumps(routing, sort_keys=True, default=str)}"
+        return bucket
+
+    def _load_history(self, session_id: str) -> Tuple[List[dict], List[dict]]:
+        """Fetch history and split it to the token budget (CPU-bound; runs in a worker thread)."""
+        memory = self.context.memory
+        return memory.fit_budget(memory.fetch(session_id))
+
+    def _budget_history(self, session_id: str, dropped: List[dict], kept: List[dict]) -> List[dict]:
+        """Stand in a rolling summary for turns trimmed from the token budget."""
+        memory = self.context.memory
+        if memory.needs_summary(session_id, dropped):
+            self._spawn(self._summarize(session_id, dropped))
+        summary = memory.summary(session_id)
+        if summary:
+            kept = [{"role": "system", "content": f"Summary of earlier conversation: {summary}"}, *kept]
+        return kept
+
+    async def _summarize(self, session_id: str, dropped: List[dict]) -> None:
+        previous = self.context.memory.summary(session_id)
+        transcript = self._format_history(dropped)
+        if previous:
+            transcript = f"Earlier summary: {previous}\n{transcript}"
+        prompt = [
+            SystemMessage(
+                content=(
+                    "Summarize this appliance repair conversation in a few sentences. Keep brands, "
+                    "model numbers, part numbers, symptoms, and steps already tried."
+                )
+            ),
+            HumanMessage(content=transcript),
+        ]
+        try:
+            result = await self.context.model_router.fast.ainvoke(prompt)
+            summary = getattr(result, "content", str(result)).strip()
+        except Exception as exc:
+            logger.warning(f"History summarization failed: {exc}")
+            return
+        if summary:
+            self.context.memory.store_summary(session_id, summary, dropped)
+
     def _format_history(self, history: List[dict]) -> str:
         if not history:
             return "(empty)"
@@ -110,6 +355,16 @@ class AgentOrchestrator:
 
     async def _should_search(self, question: str) -> bool:
         """Lightweight classifier that decides whether web search is needed."""
+        normalized = _normalize_question(question)
+        # Keyword hits are a confident YES; the LLM would almost always agree.
+        if _heuristic_search(normalized):
+            return True
+
+        cached = self._search_verdicts.get(normalized)
+        if cached is not None:
+            self._search_verdicts.move_to_end(normalized)
+            return cached
+
         fast_model = self.context.model_router.fast
         prompt = [
             SystemMessage(
@@ -125,15 +380,20 @@ class AgentOrchestrator:
             result = await fast_model.ainvoke(prompt)
             answer = getattr(result, "content", str(result)).strip().lower()
             if answer.startswith("yes") or answer.startswith("y"):
+                self._remember_verdict(normalized, True)
                 return True
             if answer.startswith("no") or answer.startswith("n"):
+                self._remember_verdict(normalized, False)
                 return False
         except Exception:
             pass
 
-        lowered = question.lower()
-        heuristics = ["error code", "recall", "price", "warranty", "meaning", "news"]
-        return any(term in lowered for term in heuristics)
+        return False
+
+    def _remember_verdict(self, normalized: str, verdict: bool) -> None:
+        self._search_verdicts[normalized] = verdict
+        if len(self._search_verdicts) > SEARCH_VERDICT_CACHE_SIZE:
+            self._search_verdicts.popitem(last=False)
 
     def _format_context(self, chunks, tool_events) -> str:
         sections: List[str] = []
@@ -157,13 +417,9 @@ class AgentOrchestrator:
         for chunk in chunks:
             summary_source = chunk.summary or getattr(chunk, "text", "")[:400]
             parts.append(
-                dedent(
-                    f"""
-                    Source: {chunk.source} (page {chunk.page_number})
-                    Snippet: {summary_source}
-                    Part numbers: {', '.join(chunk.part_numbers) or 'N/A'}
-                    """
-                ).strip()
+                f"Source: {chunk.source} (page {chunk.page_number})\n"
+                f"Snippet: {summary_source}\n"
+                f"Part numbers: {', '.join(chunk.part_numbers) or 'N/A'}"
             )
         return "\n\n".join(parts)
 
@@ -180,16 +436,12 @@ class AgentOrchestrator:
                 link = self._safe_get(result, "link")
                 snippet = self._safe_get(result, "snippet")
                 source = self._safe_get(result, "source") or "web"
-                host = urlparse(link).netloc if link else "unknown"
+                host = _url_host(link)
                 entries.append(
-                    dedent(
-                        f"""
-                        [{index}] ({source} | {host})
-                        Title: {title}
-                        URL: {link}
-                        Snippet: {snippet}
-                        """
-                    ).strip()
+                    f"[{index}] ({source} | {host})\n"
+                    f"Title: {title}\n"
+                    f"URL: {link}\n"
+                    f"Snippet: {snippet}"
                 )
         return "\n\n".join(entries)
 
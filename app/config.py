@@ -40,11 +40,18 @@ class Settings(BaseSettings):
     google_search_api_key: str = Field(default="", repr=False)
     bing_search_api_key: str = Field(default="", repr=False)
 
+    # Semantic response cache (paraphrase hits skip retrieval + LLM)
+    semantic_cache_enabled: bool = Field(default=True)
+    semantic_cache_threshold: float = Field(default=0.87)
+    semantic_cache_size: int = Field(default=512)
+
     allowed_origins: List[AnyHttpUrl] = Field(default_factory=list)
 
     class Config:
         env_file = Path(__file__).resolve().parent.parent / ".env"
         env_file_encoding = "utf-8"
+        extra = "ignore"
+        frozen = True
 
 
 @lru_cache(maxsize=1)
@@ -2,25 +2,29 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
 import time
 import uuid
+from contextlib import asynccontextmanager
 from typing import List, Optional
 
-from fastapi import Depends, FastAPI, File, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, File, Request, UploadFile, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, PlainTextResponse
-from langchain_core.messages import AIMessage
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from langchain_core.messages import AIMessage, AIMessageChunk
 from langchain_groq import ChatGroq
 from langchain_google_genai import ChatGoogleGenerativeAI
 from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
 
-from backend.agent.memory import ConversationMemory
+from backend.agent.cache import SemanticCache
+from backend.agent.memory import ConversationMemory, warm_up as warm_up_tokenizer
 from backend.agent.model_router import ModelRouter
-from backend.agent.service import AgentContext, AgentOrchestrator
+from backend.agent.service import AgentContext, AgentOrchestrator, flush_background_tasks
 from backend.app.config import Settings, get_settings, settings
-from backend.app.models import ChatRequest, ChatResponse, ChatMessage, HealthResponse, ImageUploadResponse
+from backend.app.models import ChatRequest, ChatResponse, ChatMessage, HealthResponse, ImageUploadResponse, utcnow
 from backend.monitoring.observability import CHAT_LATENCY, CHAT_REQUESTS, setup_observability
+from backend.ingestion.embeddings import DenseEmbedder
 from backend.rag.pipeline import RetrievalPipeline
 from backend.tools.router import ToolRouter
 from backend.tools.search import SearchTool
@@ -31,7 +35,19 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 # 2. Create App Instance
-app = FastAPI(title=settings.app_name, version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Model loading and Pinecone/Supabase setup block, so build off the event loop and
+    # before serving rather than at import time.
+    logger.info("Application startup: building agent")
+    app.state.agent = await _build_agent(settings)
+    logger.info("Application startup: agent ready")
+    yield
+    # Memory writes are fire-and-forget; let the last exchanges land before exiting.
+    await flush_background_tasks()
+
+
+app = FastAPI(title=settings.app_name, version="0.1.0", lifespan=lifespan)
 
 # 3. Configure Middleware
 app.add_middleware(
@@ -42,12 +58,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 4. Startup Events
-@app.on_event("startup")
-async def startup_event():
-    logger.info("Application startup: Logging initialized")
-    print("Application startup: Print initialized")
-
 _langsmith = setup_observability()
 _registry = CollectorRegistry()
 
@@ -60,8 +70,12 @@ class LocalEchoModel:
             content = getattr(last, "content", str(last))
         return AIMessage(content=f"[mock-response] {content}")
 
+    async def astream(self, messages):
+        response = await self.ainvoke(messages)
+        yield AIMessageChunk(content=response.content)
 
-def _build_agent(settings: Settings) -> AgentOrchestrator:
+
+def _build_model_router(settings: Settings) -> ModelRouter:
     # Prioritize Gemini if GEMINI_API_KEY is set
     if settings.gemini_api_key:
         logger.info("Using Google Gemini models")
@@ -93,18 +107,52 @@ def _build_agent(settings: Settings) -> AgentOrchestrator:
         fast_llm = LocalEchoModel()
         extraction_llm = LocalEchoModel()
 
-    router = ModelRouter(primary=primary_llm, fast=fast_llm, extractor=extraction_llm)
-    
+    return ModelRouter(primary=primary_llm, fast=fast_llm, extractor=extraction_llm)
+
+
+def _build_retrieval(settings: Settings) -> RetrievalPipeline | None:
     # Initialize RAG pipeline only if Pinecone is configured
     try:
         if settings.pinecone_api_key and settings.pinecone_index:
-            retrieval = RetrievalPipeline()
-        else:
-            retrieval = None
+            pipeline = RetrievalPipeline()
+            pipeline.warm_up()
+            return pipeline
     except Exception as e:
         logger.warning(f"RAG pipeline disabled: {e}")
-        retrieval = None
-    
+    return None
+
+
+def _build_semantic_cache(settings: Settings, retrieval: RetrievalPipeline | None) -> SemanticCache | None:
+    try:
+        if settings.semantic_cache_enabled:
+            # Share the retrieval embedder (same mpnet model): one model in memory, and the
+            # lookup embedding lands in its query cache, so ``retrieve`` does not encode again.
+            embedder = retrieval
+            if embedder is None:
+                embedder = DenseEmbedder()
+                # One dummy encode so the first real chat does not pay cold-model init.
+                embedder.embed([""])
+            return SemanticCache(
+                embedder=embedder,
+                threshold=settings.semantic_cache_threshold,
+                max_entries=settings.semantic_cache_size,
+            )
+    except Exception as e:
+        logger.warning(f"Semantic cache disabled: {e}")
+    return None
+
+
+def _build_retrieval_and_cache(settings: Settings) -> tuple[RetrievalPipeline | None, SemanticCache | None]:
+    retrieval = _build_retrieval(settings)
+    return retrieval, _build_semantic_cache(settings, retrieval)
+
+
+async def _build_agent(settings: Settings) -> AgentOrchestrator:
+    router, (retrieval, semantic_cache), _ = await asyncio.gather(
+        asyncio.to_thread(_build_model_router, settings),
+        asyncio.to_thread(_build_retrieval_and_cache, settings),
+        asyncio.to_thread(warm_up_tokenizer),
+    )
     tools = ToolRouter(search_tool=SearchTool(), vision_tool=VisionTool())
 
     context = AgentContext(
@@ -112,13 +160,11 @@ def _build_agent(settings: Settings) -> AgentOrchestrator:
         retrieval_pipeline=retrieval,
         tools=tools,
         memory=ConversationMemory(),
+        semantic_cache=semantic_cache,
     )
     return AgentOrchestrator(context)
 
 
-agent = _build_agent(settings)
-
-
 @app.get("/")
 async def root():
     return {"status": "ok", "message": "AI Agent Backend is running"}
@@ -136,12 +182,16 @@ def metrics() -> PlainTextResponse:
 
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest) -> ChatResponse:
+async def chat(request: ChatRequest, http_request: Request):
     start = time.perf_counter()
     session_id = request.session_id or str(uuid.uuid4())
-    request = ChatRequest(**request.model_dump(), session_id=session_id)
+    request = request.model_copy(update={"session_id": session_id})
 
     CHAT_REQUESTS.labels(endpoint="chat").inc()
+    agent: AgentOrchestrator = http_request.app.state.agent
+    if "text/event-stream" in http_request.headers.get("accept", ""):
+        return StreamingResponse(_stream_chat(agent, request, session_id, start), media_type="text/event-stream")
+
     message = await agent.run(request)
 
     latency_ms = (time.perf_counter() - start) * 1000
@@ -150,6 +200,26 @@ async def chat(request: ChatRequest) -> ChatResponse:
     return ChatResponse(session_id=session_id, messages=[message], latency_ms=latency_ms)
 
 
+async def _stream_chat(agent: AgentOrchestrator, request: ChatRequest, session_id: str, start: float):
+    """Server-sent events: one ``delta`` event per chunk, then a ``done`` event with the full response.
+
+    A failure mid-stream ends with an ``error`` event instead of silently cutting the stream.
+    """
+    try:
+        async for item in agent.stream(request):
+            if isinstance(item, ChatMessage):
+                latency_ms = (time.perf_counter() - start) * 1000
+                CHAT_LATENCY.labels(endpoint="chat").observe(latency_ms / 1000)
+                final = ChatResponse(session_id=session_id, messages=[item], latency_ms=latency_ms)
+                yield f"data: {json.dumps({'done': True, **final.model_dump(mode='json')})}\n\n"
+            else:
+                yield f"data: {json.dumps({'delta': item})}\n\n"
+    except Exception as exc:
+        logger.exception(f"Streaming chat failed session_id={session_id}: {exc}")
+        CHAT_LATENCY.labels(endpoint="chat").observe(time.perf_counter() - start)
+        yield f"data: {json.dumps({'error': 'The assistant could not complete this response.', 'session_id': session_id})}\n\n"
+
+
 @app.post("/api/upload-image", response_model=ImageUploadResponse)
 async def upload_image(file: UploadFile = File(...)) -> ImageUploadResponse:
     tmp_id = f"uploaded://{uuid.uuid4()}"
@@ -157,9 +227,10 @@ async def upload_image(file: UploadFile = File(...)) -> ImageUploadResponse:
 
 
 @app.get("/api/conversation/{session_id}", response_model=List[ChatMessage])
-async def conversation_history(session_id: str) -> List[ChatMessage]:
-    rows = agent.context.memory.fetch(session_id)
-    return [ChatMessage(role=row["role"], content=row["content"]) for row in rows]
+async def conversation_history(session_id: str, http_request: Request) -> List[ChatMessage]:
+    rows = await asyncio.to_thread(http_request.app.state.agent.context.memory.fetch, session_id)
+    now = utcnow()
+    return [ChatMessage(role=row["role"], content=row["content"], created_at=now) for row in rows]
 
 
 @app.websocket("/api/ws/chat")
@@ -167,6 +238,7 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
     print("WS Endpoint hit!")
     logger.info("WS Endpoint hit (logger)")
     await websocket.accept()
+    agent: AgentOrchestrator = websocket.app.state.agent
     session_id = str(uuid.uuid4())
     logger.info(f"WebSocket connected session={session_id}")
     try:
@@ -179,9 +251,15 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
                 image_ids=data.get("image_ids", []),
                 metadata=data.get("metadata", {}),
             )
-            response = await agent.run(request)
-            logger.info(f"Agent run complete session={session_id}, sending response")
-            await websocket.send_json(ChatResponse(session_id=session_id, messages=[response], latency_ms=0).model_dump(mode='json'))
+            start = time.perf_counter()
+            async for item in agent.stream(request):
+                if isinstance(item, ChatMessage):
+                    latency_ms = (time.perf_counter() - start) * 1000
+                    logger.info(f"Agent stream complete session={session_id}, sending final message")
+                    final = ChatResponse(session_id=session_id, messages=[item], latency_ms=latency_ms)
+                    await websocket.send_json({"done": True, **final.model_dump(mode="json")})
+                else:
+                    await websocket.send_json({"delta": item})
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected (session=%s)", session_id)
     except Exception as exc:  # pragma: no cover - defensive
@@ -1,12 +1,17 @@
 """Pydantic schemas shared across API layers."""
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
 
+def utcnow() -> datetime:
+    """Timezone-aware UTC now (``datetime.utcnow`` is deprecated and naive)."""
+    return datetime.now(timezone.utc)
+
+
 class DocumentChunk(BaseModel):
     document_id: str
     source: str
@@ -25,7 +30,7 @@ class ToolCall(BaseModel):
 class ChatMessage(BaseModel):
     role: Literal["user", "assistant", "system"]
     content: str
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utcnow)
     citations: List[DocumentChunk] = Field(default_factory=list)
     tool_calls: List[ToolCall] = Field(default_factory=list)
 
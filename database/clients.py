@@ -1,34 +1,63 @@
 """Database client initializers for Supabase and Pinecone."""
 from __future__ import annotations
 
+import threading
 from typing import Any
 
+import httpx
 from pinecone import Pinecone
-from supabase import Client, create_client
+from supabase import Client, ClientOptions, create_client
 
 from backend.app.config import settings
 
+SUPABASE_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    """True for transport-level failures where a fresh client may succeed."""
+    return isinstance(exc, (httpx.TransportError, ConnectionError))
+
 
 class DatabaseClients:
     def __init__(self) -> None:
         self._supabase: Client | None = None
         self._pinecone: Pinecone | None = None
+        self._lock = threading.Lock()
 
     @property
     def supabase(self) -> Client:
         if self._supabase is None:
-            if not settings.supabase_url or not settings.supabase_key:
-                raise RuntimeError("Supabase credentials are missing")
-            self._supabase = create_client(settings.supabase_url, settings.supabase_key)
+            with self._lock:
+                if self._supabase is None:
+                    if not settings.supabase_url or not settings.supabase_key:
+                        raise RuntimeError("Supabase credentials are missing")
+                    self._supabase = create_client(
+                        settings.supabase_url,
+                        settings.supabase_key,
+                        options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT),
+                    )
         return self._supabase
 
     @property
     def pinecone(self) -> Any:
         if self._pinecone is None:
-            if not settings.pinecone_api_key:
-                raise RuntimeError("Pinecone API key missing")
-            self._pinecone = Pinecone(api_key=settings.pinecone_api_key)
+            with self._lock:
+                if self._pinecone is None:
+                    if not settings.pinecone_api_key:
+                        raise RuntimeError("Pinecone API key missing")
+                    self._pinecone = Pinecone(api_key=settings.pinecone_api_key)
         return self._pinecone
 
+    def force_reconnect(self, client: Client) -> None:
+        """Drop ``client`` so the next access builds a fresh pool, unless it was already replaced.
+
+        The old client is not closed: other threads may still have requests in flight on it,
+        and a closed httpx client fails them with a non-transport ``RuntimeError``. Its pool is
+        released once the last reference goes away.
+        """
+        with self._lock:
+            if self._supabase is client:
+                self._supabase = None
+
 
 db_clients = DatabaseClients()
@@ -1,6 +1,7 @@
 import os
 from sentence_transformers import SentenceTransformer
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
+import tiktoken
 
 def download_models():
     # Model 1: Embedder
@@ -12,6 +13,10 @@ def download_models():
     model_name = "cross-encoder/ms-marco-MiniLM-L-6-v2"
     AutoTokenizer.from_pretrained(model_name)
     AutoModelForSequenceClassification.from_pretrained(model_name)
+
+    # Model 3: Tokenizer for conversation-memory budgeting (cached under TIKTOKEN_CACHE_DIR)
+    print("Downloading tiktoken encoding for gpt-3.5-turbo...")
+    tiktoken.encoding_for_model("gpt-3.5-turbo")
     
     print("Models downloaded successfully.")
 
@@ -4,12 +4,14 @@ from __future__ import annotations
 import argparse
 from pathlib import Path
 
-from backend.ingestion.embeddings import DenseEmbedder, SparseEmbedder
-from backend.ingestion.pipeline import IngestionConfig, IngestionPipeline, PipelineComponents
-from backend.ingestion.vision import LocalVisionAnalyzer
-
 
 def main() -> None:
+    # Imported here, not at module level: extraction workers re-import this module as
+    # __mp_main__, and they should not pay for torch and the vision stack.
+    from backend.ingestion.embeddings import DenseEmbedder, SparseEmbedder
+    from backend.ingestion.pipeline import IngestionConfig, IngestionPipeline, PipelineComponents
+    from backend.ingestion.vision import LocalVisionAnalyzer
+
     parser = argparse.ArgumentParser(description="Ingest appliance manuals")
     parser.add_argument("pdf_root", type=Path, help="Path to directory containing PDFs")
     parser.add_argument(
@@ -20,19 +22,49 @@ def main() -> None:
         action="store_true",
         help="Enable local LLaVA vision analysis for diagrams",
     )
+    parser.add_argument(
+        "--vision-cache",
+        type=Path,
+        default=None,
+        help="Persist vision analyses keyed by image hash (shelve file) across runs",
+    )
+    parser.add_argument(
+        "--vision-quantize",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Load LLaVA with 4-bit NF4 weights (requires bitsandbytes; trades accuracy for memory)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for page extraction (default: 1.5x CPU count)",
+    )
     args = parser.parse_args()
 
     components = PipelineComponents(
         dense_embedder=DenseEmbedder(),
         sparse_embedder=SparseEmbedder(),
-        vision_analyzer=LocalVisionAnalyzer() if args.with_vision else None,
+        vision_analyzer=(
+            LocalVisionAnalyzer(cache_path=args.vision_cache, quantize=args.vision_quantize)
+            if args.with_vision
+            else None
+        ),
     )
 
+    config = IngestionConfig(pdf_root=args.pdf_root, state_file=args.state_file)
+    if args.workers:
+        config.max_workers = args.workers
+
     pipeline = IngestionPipeline(
-        config=IngestionConfig(pdf_root=args.pdf_root, state_file=args.state_file),
+        config=config,
         components=components,
     )
-    pipeline.ingest()
+    try:
+        pipeline.ingest()
+    finally:
+        if components.vision_analyzer:
+            components.vision_analyzer.close()
 
 
 if __name__ == "__main__":
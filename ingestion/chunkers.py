@@ -1,7 +1,8 @@
 """Chunking utilities for PDF ingestion."""
 from __future__ import annotations
 
-from typing import Iterable, List
+from itertools import chain
+from typing import Iterable, List, Optional, Tuple
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
@@ -16,8 +17,31 @@ def chunk_text(text: str, splitter: RecursiveCharacterTextSplitter = DEFAULT_SPL
     return splitter.split_text(text)
 
 
-def chunk_iterable(pages: Iterable[str]) -> List[str]:
+def chunk_iterable(pages: Iterable[str], splitter: RecursiveCharacterTextSplitter = DEFAULT_SPLITTER) -> List[str]:
+    return list(chain.from_iterable(splitter.split_text(page) for page in pages))
+
+
+def chunk_with_spans(
+    pages: Iterable[str], splitter: RecursiveCharacterTextSplitter = DEFAULT_SPLITTER
+) -> Tuple[List[str], List[Optional[Tuple[int, int]]]]:
+    """Chunk pages and locate each chunk in ``"\n".join(pages)``.
+
+    Spans are ``(start, end)`` offsets into the joined text, or ``None`` when a chunk
+    could not be found verbatim in its page.
+    """
     chunks: List[str] = []
+    spans: List[Optional[Tuple[int, int]]] = []
+    base = 0
     for page in pages:
-        chunks.extend(chunk_text(page))
-    return chunks
+        cursor = 0
+        for chunk in splitter.split_text(page):
+            start = page.find(chunk, cursor)
+            chunks.append(chunk)
+            if start < 0:
+                spans.append(None)
+                continue
+            spans.append((base + start, base + start + len(chunk)))
+            # Chunks overlap, so the next one can start anywhere after this one's start.
+            cursor = start + 1
+        base += len(page) + 1
+    return chunks, spans
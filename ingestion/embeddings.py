@@ -1,21 +1,35 @@
 """Embedding helpers (dense + sparse) for hybrid Pinecone ingest."""
 from __future__ import annotations
 
+import os
 from collections import Counter
 from typing import List, Sequence
 
 import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
 from sklearn.feature_extraction.text import TfidfVectorizer
 
 
 class DenseEmbedder:
-    def __init__(self, model_name: str = "sentence-transformers/all-mpnet-base-v2") -> None:
-        self.model = SentenceTransformer(model_name)
-
-    def embed(self, texts: Sequence[str]) -> List[List[float]]:
-        embeddings = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
-        return embeddings.tolist()
+    def __init__(self, model_name: str = "sentence-transformers/all-mpnet-base-v2", batch_size: int = 128) -> None:
+        self.batch_size = batch_size
+        if torch.cuda.is_available():
+            self.model = SentenceTransformer(model_name, device="cuda")
+            self.model.half()
+        else:
+            self.model = SentenceTransformer(model_name, device="cpu")
+            torch.set_num_threads(os.cpu_count() or 1)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Return an ``(n, dim)`` array of L2-normalized embeddings (float16 on GPU)."""
+        return self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
 
 
 class SparseEmbedder:
@@ -27,13 +41,19 @@ class SparseEmbedder:
     def fit(self, texts: Sequence[str]) -> None:
         self.vectorizer.fit(texts)
 
+    def fit_embed(self, texts: Sequence[str]) -> List[dict]:
+        """Fit on ``texts`` and embed them with a single tokenization pass."""
+        return self._rows(self.vectorizer.fit_transform(texts))
+
     def embed(self, texts: Sequence[str]) -> List[dict]:
-        matrix = self.vectorizer.transform(texts)
+        return self._rows(self.vectorizer.transform(texts))
+
+    def _rows(self, matrix) -> List[dict]:
+        matrix = matrix.tocsr()
+        names = self.vectorizer.get_feature_names_out()
+        indptr, indices, values = matrix.indptr, matrix.indices, matrix.data
         results: List[dict] = []
-        for row in matrix:
-            coo = row.tocoo()
-            indices = coo.col
-            values = coo.data
-            sparse_dict = {str(self.vectorizer.get_feature_names_out()[idx]): float(val) for idx, val in zip(indices, values)}
-            results.append(sparse_dict)
+        for row in range(matrix.shape[0]):
+            start, end = indptr[row], indptr[row + 1]
+            results.append(dict(zip(names[indices[start:end]].tolist(), values[start:end].tolist())))
         return results
@@ -0,0 +1,56 @@
+"""Page extraction run in ingestion worker processes (imports only PyMuPDF)."""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import List, Tuple
+
+import fitz  # PyMuPDF
+
+
+def extract_pages(
+    pdf_path: Path, start: int, stop: int, tmp_dir: Path, prefix: str
+) -> Tuple[List[str], List[Tuple[int, Path]]]:
+    """Extract text and export images for pages ``[start, stop)``.
+
+    Runs in worker processes, so it opens its own document handle. Exported files are
+    named ``{prefix}_p{page}_{index}``; ``prefix`` must be unique per PDF because several
+    PDFs are extracted at once. Images shared by several pages (logos, repeated diagrams)
+    are exported once per range and the file is reused for every page that references
+    the same xref.
+    """
+    texts: List[str] = []
+    images: List[Tuple[int, Path]] = []
+    exported: dict[int, Path | None] = {}
+    with fitz.open(pdf_path) as doc:
+        for page_index in range(start, stop):
+            page = doc[page_index]
+            page_number = page_index + 1
+            texts.append(page.get_text("text"))
+            for img_index, img in enumerate(page.get_images(), start=1):
+                xref = img[0]
+                if xref not in exported:
+                    exported[xref] = _export_image(doc, xref, tmp_dir / f"{prefix}_p{page_number}_{img_index}.png")
+                image_path = exported[xref]
+                if image_path:
+                    images.append((page_number, image_path))
+    return texts, images
+
+
+# Opaque images at least this large are written as JPEG; PNG zlib dominates export time.
+JPEG_MIN_PIXELS = 1_000_000
+JPEG_QUALITY = 85
+
+
+def _export_image(doc: fitz.Document, xref: int, image_path: Path) -> Path | None:
+    try:
+        pix = fitz.Pixmap(doc, xref)
+        if pix.n - pix.alpha > 3:
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        if not pix.alpha and pix.width * pix.height >= JPEG_MIN_PIXELS:
+            image_path = image_path.with_suffix(".jpg")
+            pix.pil_save(image_path, format="JPEG", quality=JPEG_QUALITY)
+        else:
+            pix.pil_save(image_path, format="PNG", optimize=False, compress_level=1)
+        return image_path
+    except Exception:
+        return None
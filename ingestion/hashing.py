@@ -0,0 +1,19 @@
+"""Streaming file digests shared by the ingestion steps."""
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+
+DIGEST_CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(path: Path) -> str:
+    with open(path, "rb", buffering=0) as handle:
+        if hasattr(hashlib, "file_digest"):  # Python 3.11+
+            return hashlib.file_digest(handle, "sha256").hexdigest()
+        # The CUDA ingestion image still ships Python 3.10; stream through one reusable buffer.
+        sha = hashlib.sha256()
+        buffer = memoryview(bytearray(DIGEST_CHUNK_SIZE))
+        while size := handle.readinto(buffer):
+            sha.update(buffer[:size])
+        return sha.hexdigest()
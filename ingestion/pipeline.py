@@ -1,29 +1,57 @@
 """Privacy-first PDF ingestion pipeline for manuals and diagrams."""
 from __future__ import annotations
 
-import hashlib
+import multiprocessing
+import os
+from bisect import bisect_left
+import zlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterable, List
+from typing import Any, Iterable, List, Tuple
 
 import fitz  # PyMuPDF
+import numpy as np
 import re
 
 from backend.app.config import settings
 from backend.database.clients import db_clients
-from backend.ingestion.chunkers import chunk_iterable
+from backend.ingestion.chunkers import chunk_with_spans
 from backend.ingestion.embeddings import DenseEmbedder, SparseEmbedder
+from backend.ingestion.extraction import extract_pages
+from backend.ingestion.hashing import file_sha256
 from backend.ingestion.state import StateTracker
 from backend.ingestion.vision import LocalVisionAnalyzer
 
 
+def _worker_context() -> multiprocessing.context.BaseContext:
+    # Fork would copy this process's torch/CUDA state and client threads into workers.
+    # A forkserver preloaded with only the extraction module forks clean, light workers.
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["backend.ingestion.extraction"])
+    return context
+
+
+def _default_workers() -> int:
+    # Oversubscribe slightly: extraction mixes CPU work with decompression and disk I/O.
+    return max(1, int((os.cpu_count() or 1) * 1.5))
+
+
 @dataclass
 class IngestionConfig:
     pdf_root: Path
     state_file: Path
     namespace: str = "appliance_manuals"
     batch_size: int = 32
+    upsert_threads: int = 30
     tmp_dir: Path = Path(".ingestion/tmp")
+    max_workers: int = field(default_factory=_default_workers)
+    page_chunk_size: int = 500
+    # Page-range extraction results (queued, running, or extracted but not yet embedded)
+    # held at once; bounds RAM while keeping every worker busy. Defaults to 2x max_workers.
+    max_buffered_ranges: int | None = None
 
 
 @dataclass
@@ -40,27 +68,97 @@ class IngestionPipeline:
         self.state = StateTracker.load(config.state_file)
         self.tmp_dir = config.tmp_dir
         self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self._index: Any | None = None
 
     def ingest(self) -> None:
-        for pdf_path in self._iter_pdfs():
-            digest = self._digest(pdf_path)
-            status = self.state.state.get(digest, {}).get("status")
-            if status == "completed":
-                continue
+        try:
+            self._ingest()
+        finally:
+            self._close_index()
+        self.state.persist()
+
+    def _ingest(self) -> None:
+        # Page extraction fans out across worker processes; embedding, vision analysis,
+        # and upserts stay here where the models and clients live. PDFs are submitted
+        # until ``max_buffered_ranges`` page ranges are outstanding, then the oldest PDF
+        # is embedded and upserted while the workers extract the ones behind it.
+        limit = self.config.max_buffered_ranges or 2 * self.config.max_workers
+        pending: deque[Tuple[Path, str, dict, List[Future]]] = deque()
+        buffered = 0
+        with ProcessPoolExecutor(max_workers=self.config.max_workers, mp_context=_worker_context()) as pool:
+            for pdf_path in self._iter_pdfs():
+                # Unchanged files (same path, size, mtime) skip the full-content hash.
+                stat = pdf_path.stat()
+                if self.state.completed_unchanged(str(pdf_path), stat.st_size, stat.st_mtime_ns):
+                    continue
+
+                meta = {
+                    "filename": pdf_path.name,
+                    "path": str(pdf_path),
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                }
+                digest = self._digest(pdf_path)
+                status = self.state.state.get(digest, {}).get("status")
+                if status == "completed":
+                    # Same content under a new path or mtime; refresh the record so the
+                    # next run takes the stat fast path.
+                    self.state.mark(digest, "completed", meta)
+                    continue
+
+                self.state.mark(digest, "processing", meta)
+                futures = self._submit_extraction(pool, pdf_path, digest)
+                pending.append((pdf_path, digest, meta, futures))
+                buffered += len(futures)
+                while pending and buffered >= limit:
+                    buffered -= len(pending[0][3])
+                    self._complete(*pending.popleft())
+
+            while pending:
+                self._complete(*pending.popleft())
+
+    def _pinecone_index(self) -> Any:
+        # One index handle per run: each handle owns a pool_threads ThreadPool that the
+        # client keeps alive via atexit, so per-PDF handles would leak threads.
+        if self._index is None:
+            self._index = db_clients.pinecone.Index(settings.pinecone_index, pool_threads=self.config.upsert_threads)
+        return self._index
+
+    def _close_index(self) -> None:
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+    def _submit_extraction(self, pool: ProcessPoolExecutor, pdf_path: Path, digest: str) -> List[Future]:
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+        step = self.config.page_chunk_size
+        # Same-named PDFs in different brand/type folders extract concurrently; the digest
+        # keeps their exported images apart.
+        prefix = f"{pdf_path.stem}_{digest[:12]}"
+        return [
+            pool.submit(extract_pages, pdf_path, start, min(start + step, page_count), self.tmp_dir, prefix)
+            for start in range(0, page_count, step)
+        ]
 
-            self.state.mark(digest, "processing", {"filename": pdf_path.name})
-            self._process_pdf(pdf_path)
-            self.state.mark(digest, "completed", {"filename": pdf_path.name})
+    def _complete(self, pdf_path: Path, digest: str, meta: dict, futures: List[Future]) -> None:
+        text_pages: List[str] = []
+        images: List[Tuple[int, Path]] = []
+        # Futures are in page order, so concatenating keeps pages ordered.
+        for future in futures:
+            texts, exported = future.result()
+            text_pages.extend(texts)
+            images.extend(exported)
+        self._process_pdf(pdf_path, text_pages, images)
+        self.state.mark(digest, "completed", meta)
 
     def _iter_pdfs(self) -> Iterable[Path]:
         yield from sorted(self.config.pdf_root.glob("**/*.pdf"))
 
     def _digest(self, pdf_path: Path) -> str:
-        sha = hashlib.sha256()
-        sha.update(pdf_path.read_bytes())
-        return sha.hexdigest()
+        return file_sha256(pdf_path)
 
-    def _process_pdf(self, pdf_path: Path) -> None:
+    def _process_pdf(self, pdf_path: Path, text_pages: List[str], images: List[Tuple[int, Path]]) -> None:
         doc_id = pdf_path.stem
         
         # NEW: Extract metadata from directory structure
@@ -79,60 +177,69 @@ class IngestionPipeline:
             appliance_type = "unknown"
             brand = "unknown"
 
-        text_pages: List[str] = []
         image_metadata: List[dict] = []
+        if self.components.vision_analyzer and images:
+            # One call per PDF; the analyzer batches generation across the document's images.
+            descriptions = self.components.vision_analyzer.analyze_batch([path for _, path in images])
+            for (page_number, image_path), description in zip(images, descriptions):
+                image_metadata.append(
+                    {
+                        "document_id": doc_id,
+                        "page_number": page_number,
+                        "image_path": str(image_path),
+                        "analysis": description,
+                    }
+                )
 
-        with fitz.open(pdf_path) as doc:
-            for page_number, page in enumerate(doc, start=1):
-                text_pages.append(page.get_text("text"))
-                for img_index, img in enumerate(page.get_images(), start=1):
-                    image_path = self._export_image(doc, img[0], doc_id, page_number, img_index)
-                    if image_path and self.components.vision_analyzer:
-                        description = self.components.vision_analyzer.analyze(image_path)
-                        image_metadata.append(
-                            {
-                                "document_id": doc_id,
-                                "page_number": page_number,
-                                "image_path": str(image_path),
-                                "analysis": description,
-                            }
-                        )
-
-        chunks = chunk_iterable(text_pages)
+        chunks, spans = chunk_with_spans(text_pages)
         if not chunks:
             return
 
-        self.components.sparse_embedder.fit(chunks)
-        dense_vectors = self.components.dense_embedder.embed(chunks)
-        sparse_vectors = self.components.sparse_embedder.embed(chunks)
+        # One regex pass per pattern over the whole document, attributed back to chunks.
+        full_text = "\n".join(text_pages)
+        chunk_part_numbers = attribute_matches(PART_NUMBER_RE, full_text, chunks, spans)
+        chunk_models = attribute_matches(MODEL_RE, full_text, chunks, spans)
 
-        pinecone = db_clients.pinecone.Index(settings.pinecone_index)
-        to_upsert = []
-        for idx, (dense, sparse, chunk_text) in enumerate(zip(dense_vectors, sparse_vectors, chunks)):
-            part_numbers = extract_part_numbers(chunk_text)
-            models_in_chunk = extract_model_numbers(chunk_text)
+        # Dense encoding (torch, releases the GIL) overlaps the TF-IDF fit/transform.
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            dense_future = pool.submit(self.components.dense_embedder.embed, chunks)
+            sparse_vectors = self.components.sparse_embedder.fit_embed(chunks)
+            dense_vectors = dense_future.result()
 
-            metadata = {
-                "document_id": doc_id,
-                "chunk_index": idx,
-                "text": chunk_text[:2000],
-                "appliance_type": appliance_type,
-                "brand": brand,
-                "part_numbers": part_numbers,
-                "appliance_models": models_in_chunk,
-            }
+        pinecone = self._pinecone_index()
+        # One float32 matrix instead of a per-chunk astype copy; the client converts the
+        # numpy row views to lists itself.
+        dense_matrix = np.asarray(dense_vectors, dtype=np.float32)
+        truncated = [chunk_text[:2000] for chunk_text in chunks]
+        base_metadata = {"document_id": doc_id, "appliance_type": appliance_type, "brand": brand}
+        to_upsert = []
+        for idx, sparse in enumerate(sparse_vectors):
+            metadata = base_metadata.copy()
+            metadata["chunk_index"] = idx
+            metadata["text"] = truncated[idx]
+            metadata["part_numbers"] = chunk_part_numbers[idx]
+            metadata["appliance_models"] = chunk_models[idx]
             to_upsert.append(
                 {
                     "id": f"{doc_id}-{idx}",
-                    "values": dense,
+                    "values": dense_matrix[idx],
                     "sparse_values": self._map_sparse_tokens(sparse),
                     "metadata": metadata,
                 }
             )
 
-        for start in range(0, len(to_upsert), self.config.batch_size):
-            batch = to_upsert[start : start + self.config.batch_size]
-            pinecone.upsert(vectors=batch, namespace=self.config.namespace)
+        # Submit every batch before waiting so request RTTs overlap; the index's
+        # pool_threads bounds how many are in flight.
+        pending = [
+            pinecone.upsert(
+                vectors=to_upsert[start : start + self.config.batch_size],
+                namespace=self.config.namespace,
+                async_req=True,
+            )
+            for start in range(0, len(to_upsert), self.config.batch_size)
+        ]
+        for result in pending:
+            result.get()
 
         supabase = db_clients.supabase
         supabase.table("documents").upsert(
@@ -144,29 +251,22 @@ class IngestionPipeline:
             }
         ).execute()
 
-    def _export_image(self, doc: fitz.Document, xref: int, doc_id: str, page_number: int, img_index: int) -> Path | None:
-        try:
-            pix = fitz.Pixmap(doc, xref)
-            if pix.n - pix.alpha > 3:
-                pix = fitz.Pixmap(fitz.csRGB, pix)
-            image_path = self.tmp_dir / f"{doc_id}_p{page_number}_{img_index}.png"
-            pix.save(image_path)
-            return image_path
-        except Exception:
-            return None
-
     def _map_sparse_tokens(self, sparse: dict) -> dict:
-        import zlib
+        # Plain lists: newer clients reject numpy sparse arrays and numpy scalars in lists.
+        return {"indices": list(map(_token_index, sparse)), "values": list(sparse.values())}
+
 
-        indices: List[int] = []
-        values: List[float] = []
-        for token, weight in sparse.items():
-            indices.append(zlib.crc32(token.encode("utf-8")))
-            values.append(weight)
-        return {"indices": indices, "values": values}
+@lru_cache(maxsize=65536)
+def _token_index(token: str) -> int:
+    # CRC32 keeps indices compatible with vectors already in the index; the vocabulary is
+    # small and repeats across chunks, so each token is hashed once per process.
+    return zlib.crc32(token.encode("utf-8"))
 
 
-PART_NUMBER_RE = re.compile(r"\b[A-Z0-9]{3,5}-?[0-9A-Z]{3,6}\b")
+# Part/model identifiers are ASCII; re.ASCII keeps \b from consulting Unicode tables.
+PART_NUMBER_RE = re.compile(r"\b[A-Z0-9]{3,5}-?[0-9A-Z]{3,6}\b", re.ASCII)
+# very rough example – customize for your manuals
+MODEL_RE = re.compile(r"\b[A-Z0-9]{3,}-[A-Z0-9/]{3,}\b", re.ASCII)
 
 def extract_part_numbers(text: str) -> list[str]:
     # tune this regex to your brand patterns
@@ -175,6 +275,25 @@ def extract_part_numbers(text: str) -> list[str]:
     return sorted(set(candidates))
 
 def extract_model_numbers(text: str) -> list[str]:
-    # very rough example – customize for your manuals
-    MODEL_RE = re.compile(r"\b[A-Z0-9]{3,}-[A-Z0-9/]{3,}\b")
     return sorted(set(MODEL_RE.findall(text)))
+
+
+def attribute_matches(
+    pattern: re.Pattern, text: str, chunks: List[str], spans: List[Tuple[int, int] | None]
+) -> List[List[str]]:
+    """Scan ``text`` once and return, per chunk, the sorted unique matches inside its span.
+
+    Chunks without a span fall back to scanning the chunk text directly.
+    """
+    matches = [(match.start(), match.end(), match.group()) for match in pattern.finditer(text)]
+    starts = [start for start, _, _ in matches]
+    per_chunk: List[List[str]] = []
+    for chunk, span in zip(chunks, spans):
+        if span is None:
+            per_chunk.append(sorted(set(pattern.findall(chunk))))
+            continue
+        chunk_start, chunk_end = span
+        lo = bisect_left(starts, chunk_start)
+        hi = bisect_left(starts, chunk_end, lo)
+        per_chunk.append(sorted({token for _, end, token in matches[lo:hi] if end <= chunk_end}))
+    return per_chunk
@@ -2,28 +2,116 @@
 from __future__ import annotations
 
 import json
-from dataclasses import dataclass
+import os
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict
+from typing import IO, Dict
+
+# Compact once the log holds this many times more records than live digests.
+COMPACT_FACTOR = 10
 
 
 @dataclass
 class StateTracker:
+    """Append-only JSON-lines log of digest records; the last record per digest wins.
+
+    Legacy single-object JSON snapshots are read transparently and compacted into the log.
+    Records that carry a ``path`` are also indexed by it in ``by_path`` (path -> digest).
+    """
+
     path: Path
     state: Dict[str, dict]
+    records: int = 0
+    by_path: Dict[str, str] = field(default_factory=dict, init=False, repr=False)
+    _log: IO[str] | None = field(default=None, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        for digest, record in self.state.items():
+            if "path" in record:
+                self.by_path[record["path"]] = digest
 
     @classmethod
     def load(cls, path: Path) -> "StateTracker":
-        if path.exists():
-            data = json.loads(path.read_text())
-        else:
-            data = {}
-        return cls(path=path, state=data)
+        if not path.exists():
+            return cls(path=path, state={})
+
+        text = path.read_text()
+        legacy = cls._parse_snapshot(text)
+        if legacy is not None:
+            tracker = cls(path=path, state=legacy)
+            tracker.persist()
+            return tracker
+
+        data: Dict[str, dict] = {}
+        records = 0
+        for line in text.splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn final line from an interrupted run.
+                continue
+            digest = record.pop("digest", None)
+            if digest is None:
+                continue
+            data[digest] = record
+            records += 1
+        tracker = cls(path=path, state=data, records=records)
+        # A missing trailing newline means a torn write; compact so new appends start clean.
+        if (text and not text.endswith("\n")) or records > COMPACT_FACTOR * max(len(data), 1):
+            tracker.persist()
+        return tracker
+
+    @staticmethod
+    def _parse_snapshot(text: str) -> Dict[str, dict] | None:
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        if isinstance(data, dict) and all(isinstance(value, dict) for value in data.values()):
+            return data
+        return None
 
     def mark(self, digest: str, status: str, meta: dict | None = None) -> None:
         self.state[digest] = {"status": status, **(meta or {})}
-        self.persist()
+        if "path" in self.state[digest]:
+            self.by_path[self.state[digest]["path"]] = digest
+        log = self._open_log()
+        log.write(json.dumps({"digest": digest, **self.state[digest]}) + "\n")
+        log.flush()
+        os.fsync(log.fileno())
+        self.records += 1
 
     def persist(self) -> None:
+        """Rewrite the log as one record per digest (atomic replace)."""
+        self.close()
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        self.path.write_text(json.dumps(self.state, indent=2))
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as handle:
+            for digest, record in self.state.items():
+                handle.write(json.dumps({"digest": digest, **record}) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, self.path)
+        self.records = len(self.state)
+
+    def completed_unchanged(self, path: str, size: int, mtime_ns: int) -> bool:
+        """True if ``path`` was completed with the same size and mtime, so it need not be hashed."""
+        digest = self.by_path.get(path)
+        record = self.state.get(digest, {}) if digest else {}
+        return (
+            record.get("status") == "completed"
+            and record.get("path") == path
+            and record.get("size") == size
+            and record.get("mtime_ns") == mtime_ns
+        )
+
+    def close(self) -> None:
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def _open_log(self) -> IO[str]:
+        if self._log is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._log = open(self.path, "a")
+        return self._log
@@ -1,35 +1,138 @@
 """Self-hosted vision model wrapper (LLaVA-NeXT) for diagrams."""
 from __future__ import annotations
 
+import hashlib
+import shelve
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Sequence
 
 import torch
 from PIL import Image
-from transformers import AutoProcessor, LlavaForConditionalGeneration
+from transformers import AutoProcessor, BitsAndBytesConfig, LlavaForConditionalGeneration
+from transformers.utils import is_bitsandbytes_available, is_flash_attn_2_available
+
+from backend.ingestion.hashing import file_sha256
+
+ANALYSIS_PROMPT = (
+    "You are an appliance service technician. Describe the diagram, "
+    "list part numbers, and identify appliance type and model labels."
+)
 
 
 class LocalVisionAnalyzer:
-    def __init__(self, model_name: str = "llava-hf/llava-v1.6-34b-hf") -> None:
+    def __init__(
+        self,
+        model_name: str = "llava-hf/llava-v1.6-34b-hf",
+        cache_size: int = 1024,
+        cache_path: Path | None = None,
+        batch_size: int = 8,
+        quantize: bool = False,
+        compile_model: bool = False,
+    ) -> None:
         if not torch.cuda.is_available():
             raise RuntimeError("LocalVisionAnalyzer requires a CUDA-enabled GPU.")
         self.device = "cuda"
         self.processor = AutoProcessor.from_pretrained(model_name)
-        self.model = LlavaForConditionalGeneration.from_pretrained(
-            model_name, torch_dtype=torch.float16, device_map="auto"
-        )
+        # Decoder-only generation needs left padding so every prompt ends at the same position.
+        self.processor.tokenizer.padding_side = "left"
+        self.batch_size = batch_size
+        options = self._load_options(quantize)
+        self.model = LlavaForConditionalGeneration.from_pretrained(model_name, device_map="auto", **options)
+        if compile_model:
+            self.model = torch.compile(self.model, mode="reduce-overhead")
+        # Shared diagrams recur across manuals; key generations by image content, scoped to
+        # everything that changes the output so a persisted cache never serves another setup.
+        setup = f"{model_name}|{ANALYSIS_PROMPT}|{options['torch_dtype']}|quantize={quantize}"
+        self._cache_scope = hashlib.blake2b(setup.encode("utf-8"), digest_size=8).hexdigest()
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._disk_cache = None
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._disk_cache = shelve.open(str(cache_path))
 
     def analyze(self, image_path: Path) -> Dict[str, str]:
-        image = Image.open(image_path).convert("RGB")
-        prompt = (
-            "You are an appliance service technician. Describe the diagram, "
-            "list part numbers, and identify appliance type and model labels."
-        )
-        inputs = self.processor(text=prompt, images=image, return_tensors="pt").to(self.device)
+        return self.analyze_batch([image_path])[0]
+
+    def analyze_batch(self, image_paths: Sequence[Path]) -> List[Dict[str, str]]:
+        """Analyze several images, generating cache misses ``batch_size`` at a time."""
+        keys = [f"{self._cache_scope}:{file_sha256(path)}" for path in image_paths]
+        results: Dict[str, Dict[str, str]] = {}
+        misses: Dict[str, Path] = {}
+        for key, path in zip(keys, image_paths):
+            if key in results or key in misses:
+                continue
+            cached = self._cached(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                misses[key] = path
+
+        pending = list(misses.items())
+        for start in range(0, len(pending), self.batch_size):
+            group = pending[start : start + self.batch_size]
+            for (key, _), result in zip(group, self._generate([path for _, path in group])):
+                self._store(key, result)
+                results[key] = result
+        return [results[key] for key in keys]
+
+    @staticmethod
+    def _load_options(quantize: bool) -> dict:
+        # flash-attn is an optional GPU-only extra and does not change outputs; use it when
+        # installed. Quantization does affect analysis quality, so it is opt-in only.
+        dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        options: dict = {"torch_dtype": dtype}
+        if is_flash_attn_2_available():
+            options["attn_implementation"] = "flash_attention_2"
+        if quantize:
+            if not is_bitsandbytes_available():
+                raise RuntimeError("4-bit vision quantization requested but bitsandbytes is not installed")
+            options["quantization_config"] = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_compute_dtype=dtype,
+                bnb_4bit_quant_type="nf4",
+            )
+        return options
+
+    def close(self) -> None:
+        if self._disk_cache is not None:
+            self._disk_cache.close()
+            self._disk_cache = None
+
+    def _cached(self, key: str) -> Dict[str, str] | None:
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if self._disk_cache is not None and key in self._disk_cache:
+            result = self._disk_cache[key]
+            self._remember(key, result)
+            return result
+        return None
+
+    def _store(self, key: str, result: Dict[str, str]) -> None:
+        self._remember(key, result)
+        if self._disk_cache is not None:
+            self._disk_cache[key] = result
+
+    def _remember(self, key: str, result: Dict[str, str]) -> None:
+        self._cache[key] = result
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _generate(self, image_paths: Sequence[Path]) -> List[Dict[str, str]]:
+        images = [Image.open(path).convert("RGB") for path in image_paths]
+        inputs = self.processor(
+            text=[ANALYSIS_PROMPT] * len(images),
+            images=images,
+            return_tensors="pt",
+            padding=True,
+        ).to(self.device)
         generated = self.model.generate(
             **inputs,
             max_new_tokens=400,
             temperature=0.2,
         )
-        text = self.processor.decode(generated[0], skip_special_tokens=True)
-        return {"description": text}
+        texts = self.processor.batch_decode(generated, skip_special_tokens=True)
+        return [{"description": text} for text in texts]
@@ -2,11 +2,16 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import List
+from functools import lru_cache
+from typing import List, Sequence
 
-from haystack import Pipeline
+from haystack import Document, Pipeline
+from haystack.utils import Secret
 
 logger = logging.getLogger(__name__)
 logger.info("Loading RAG pipeline module (build: 2026-02-07-v2)")
@@ -31,18 +36,39 @@ class RetrievalResult:
     text: str
 
     def to_model(self) -> DocumentChunk:
-        return DocumentChunk(
-            document_id=self.document_id,
-            source=self.source,
-            page_number=self.page_number,
-            appliance_type=self.appliance_type,
-            summary=self.summary or self.text[:280],
-            part_numbers=self.part_numbers,
+        return _citation(
+            self.document_id,
+            self.source,
+            self.page_number,
+            self.appliance_type,
+            self.summary or self.text[:280],
+            tuple(self.part_numbers),
         )
 
 
+@lru_cache(maxsize=4096)
+def _citation(
+    document_id: str,
+    source: str,
+    page_number: int | None,
+    appliance_type: str | None,
+    summary: str,
+    part_numbers: tuple[str, ...],
+) -> DocumentChunk:
+    # Hot chunks recur across queries; reuse one citation model per chunk, and skip
+    # validation since every field comes from our own index metadata.
+    return DocumentChunk.model_construct(
+        document_id=document_id,
+        source=source,
+        page_number=page_number,
+        appliance_type=appliance_type,
+        summary=summary,
+        part_numbers=list(part_numbers),
+    )
+
+
 class RetrievalPipeline:
-    def __init__(self, top_k: int = 5) -> None:
+    def __init__(self, top_k: int = 5, embedding_cache_size: int = 10_000) -> None:
         self.top_k = top_k
         self.document_store = PineconeDocumentStore(
             api_key=Secret.from_token(settings.pinecone_api_key),
@@ -50,11 +76,13 @@ class RetrievalPipeline:
             namespace=settings.pinecone_index,
             dimension=768,
         )
+        # The query embedder runs outside the pipeline so repeated queries skip the forward pass.
+        self.text_embedder = SentenceTransformersTextEmbedder(model="sentence-transformers/all-mpnet-base-v2")
+        self.embedding_cache_size = embedding_cache_size
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._embedder_lock = threading.Lock()
+        self._embedder_ready = False
         self.pipeline = Pipeline()
-        self.pipeline.add_component(
-            "text_embedder",
-            SentenceTransformersTextEmbedder(model="sentence-transformers/all-mpnet-base-v2"),
-        )
         self.pipeline.add_component(
             "retriever",
             PineconeEmbeddingRetriever(document_store=self.document_store, top_k=top_k * 2),
@@ -63,19 +91,53 @@ class RetrievalPipeline:
             "ranker",
             SentenceTransformersSimilarityRanker(model="cross-encoder/ms-marco-MiniLM-L-6-v2", top_k=top_k),
         )
-        self.pipeline.connect("text_embedder.embedding", "retriever.query_embedding")
         self.pipeline.connect("retriever", "ranker")
 
+    def warm_up(self) -> None:
+        """Load the embedder and cross-encoder and run one local inference through each.
+
+        Skips Pinecone, so the first real ``retrieve`` pays neither model load nor first-call setup.
+        """
+        with self._embedder_lock:
+            self.text_embedder.warm_up()
+            self._embedder_ready = True
+        self.pipeline.warm_up()
+        self.text_embedder.run(text="warmup")
+        self.pipeline.get_component("ranker").run(query="warmup", documents=[Document(content="warmup")])
+
     async def retrieve(self, query: str) -> List[RetrievalResult]:
-        result = await asyncio.to_thread(
-            self.pipeline.run,
+        result = await asyncio.to_thread(self._run, query)
+        documents = result["ranker"]["documents"]
+        return [self._to_result(doc) for doc in documents]
+
+    def _run(self, query: str) -> dict:
+        return self.pipeline.run(
             data={
-                "text_embedder": {"text": query},
+                "retriever": {"query_embedding": self._embed_query(query)},
                 "ranker": {"query": query},
             },
         )
-        documents = result["ranker"]["documents"]
-        return [self._to_result(doc) for doc in documents]
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed texts with the query embedder, sharing its cache with ``retrieve``."""
+        return [self._embed_query(text) for text in texts]
+
+    def _embed_query(self, query: str) -> List[float]:
+        key = hashlib.blake2b(" ".join(query.lower().split()).encode("utf-8"), digest_size=16).hexdigest()
+        with self._embedder_lock:
+            embedding = self._embedding_cache.get(key)
+            if embedding is not None:
+                self._embedding_cache.move_to_end(key)
+                return embedding
+            if not self._embedder_ready:
+                self.text_embedder.warm_up()
+                self._embedder_ready = True
+        embedding = self.text_embedder.run(text=query)["embedding"]
+        with self._embedder_lock:
+            self._embedding_cache[key] = embedding
+            while len(self._embedding_cache) > self.embedding_cache_size:
+                self._embedding_cache.popitem(last=False)
+        return embedding
 
     def _to_result(self, document) -> RetrievalResult:
         meta = document.meta or {}
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from backend.agent.model_router import ModelRouter
+from backend.agent.service import AgentContext, AgentOrchestrator, flush_background_tasks
+from backend.app.main import _stream_chat
+from backend.app.models import ChatRequest
+
+
+class StreamingModel:
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+
+    async def astream(self, messages):
+        for index, token in enumerate(['Check ', 'the ', 'drain ', 'hose.']):
+            if index == self.fail_after:
+                raise RuntimeError('provider dropped the stream')
+            await asyncio.sleep(0)
+            yield AIMessageChunk(content=token)
+
+
+class NoTools:
+    async def route(self, message, metadata):
+        return []
+
+
+class RecordingMemory:
+    def __init__(self):
+        self.appended = []
+
+    def fetch(self, session_id):
+        return []
+
+    def fit_budget(self, history):
+        return [], history
+
+    def needs_summary(self, session_id, dropped):
+        return False
+
+    def summary(self, session_id):
+        return None
+
+    def append_many(self, session_id, messages):
+        self.appended.append((session_id, list(messages)))
+
+
+def _orchestrator(model):
+    memory = RecordingMemory()
+    context = AgentContext(
+        model_router=ModelRouter(primary=model, fast=model, extractor=model),
+        retrieval_pipeline=None,
+        tools=NoTools(),
+        memory=memory,
+    )
+    return AgentOrchestrator(context), memory
+
+
+REQUEST = ChatRequest(session_id='s1', message='dishwasher will not drain')
+
+
+def test_client_disconnect_records_partial_answer():
+    async def scenario():
+        agent, memory = _orchestrator(StreamingModel())
+        stream = agent.stream(REQUEST)
+        received = [await stream.__anext__(), await stream.__anext__()]
+        await stream.aclose()
+        await flush_background_tasks()
+        return received, memory
+
+    received, memory = asyncio.run(scenario())
+
+    assert received == ['Check ', 'the ']
+    assert memory.appended == [
+        ('s1', [('user', 'dishwasher will not drain'), ('assistant', 'Check the ')]),
+    ]
+
+
+def test_model_failure_mid_stream_records_nothing():
+    async def scenario():
+        agent, memory = _orchestrator(StreamingModel(fail_after=2))
+        with pytest.raises(RuntimeError):
+            async for _ in agent.stream(REQUEST):
+                pass
+        await flush_background_tasks()
+        return memory
+
+    assert asyncio.run(scenario()).appended == []
+
+
+def test_sse_stream_ends_with_error_event_on_failure():
+    async def scenario():
+        agent, _ = _orchestrator(StreamingModel(fail_after=1))
+        return [event async for event in _stream_chat(agent, REQUEST, 's1', time.perf_counter())]
+
+    events = [json.loads(event.removeprefix('data: ')) for event in asyncio.run(scenario())]
+
+    assert events[0] == {'delta': 'Check '}
+    assert 'error' in events[-1]
+    assert events[-1]['session_id'] == 's1'
@@ -0,0 +1,38 @@
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from backend.ingestion.chunkers import chunk_with_spans
+from backend.ingestion.pipeline import MODEL_RE, PART_NUMBER_RE, attribute_matches
+
+PAGES = [
+    'Replace filter WF3CB-4500 every six months. Door gasket DA97-12345 seals the fresh food section. '
+    'Model RF28R7351SR uses ice maker DA97-07365G. Check the drain pump 5304-517203 for debris.',
+    'Control board W10503278 fits WRF555SDFZ-09 units. Thermistor DA32-00006W sits behind the panel. '
+    'The evaporator fan WR60X10141 runs when the door closes.',
+]
+
+SPLITTER = RecursiveCharacterTextSplitter(chunk_size=80, chunk_overlap=20, separators=['\n\n', '\n', '.'])
+
+
+def test_spans_locate_chunks_in_joined_text():
+    chunks, spans = chunk_with_spans(PAGES, splitter=SPLITTER)
+    full_text = '\n'.join(PAGES)
+
+    assert len(chunks) > len(PAGES)
+    for chunk, span in zip(chunks, spans):
+        assert span is not None
+        assert full_text[span[0]:span[1]] == chunk
+
+
+def test_attribute_matches_equals_per_chunk_scan():
+    chunks, spans = chunk_with_spans(PAGES, splitter=SPLITTER)
+    full_text = '\n'.join(PAGES)
+
+    for pattern in (PART_NUMBER_RE, MODEL_RE):
+        expected = [sorted(set(pattern.findall(chunk))) for chunk in chunks]
+        assert attribute_matches(pattern, full_text, chunks, spans) == expected
+
+
+def test_chunk_without_span_falls_back_to_its_own_text():
+    chunk = 'Gasket DA97-12345 only here.'
+
+    assert attribute_matches(PART_NUMBER_RE, 'unrelated text', [chunk], [None]) == [['DA97-12345']]
@@ -0,0 +1,104 @@
+import asyncio
+
+from langchain_core.messages import AIMessage
+
+from backend.agent.model_router import ModelRouter
+from backend.agent.service import AgentContext, AgentOrchestrator, flush_background_tasks
+from backend.app.models import ChatRequest
+
+
+class SlowModel:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return AIMessage(content=f'answer {self.calls}')
+
+
+class NoTools:
+    async def route(self, message, metadata):
+        return []
+
+
+class RecordingMemory:
+    def __init__(self):
+        self.appended = []
+
+    def fetch(self, session_id):
+        return []
+
+    def fit_budget(self, history):
+        return [], history
+
+    def needs_summary(self, session_id, dropped):
+        return False
+
+    def summary(self, session_id):
+        return None
+
+    def append_many(self, session_id, messages):
+        self.appended.append((session_id, list(messages)))
+
+
+def _orchestrator():
+    model = SlowModel()
+    memory = RecordingMemory()
+    context = AgentContext(
+        model_router=ModelRouter(primary=model, fast=model, extractor=model),
+        retrieval_pipeline=None,
+        tools=NoTools(),
+        memory=memory,
+    )
+    return AgentOrchestrator(context), model, memory
+
+
+def test_duplicate_requests_in_one_session_share_a_run():
+    async def scenario():
+        agent, model, memory = _orchestrator()
+        request = ChatRequest(session_id='s1', message='dishwasher will not drain')
+        first, second = await asyncio.gather(agent.run(request), agent.run(request))
+        await flush_background_tasks()
+        return first, second, model, memory
+
+    first, second, model, memory = asyncio.run(scenario())
+
+    assert model.calls == 1
+    assert first.content == second.content
+    # Each caller still records the exchange.
+    assert len(memory.appended) == 2
+
+
+def test_same_question_from_other_sessions_is_not_shared():
+    async def scenario():
+        agent, model, _ = _orchestrator()
+        await asyncio.gather(
+            agent.run(ChatRequest(session_id='s1', message='dishwasher will not drain')),
+            agent.run(ChatRequest(session_id='s2', message='dishwasher will not drain')),
+        )
+        await flush_background_tasks()
+        return model
+
+    assert asyncio.run(scenario()).calls == 2
+
+
+def test_waiter_reruns_when_leader_is_cancelled():
+    async def scenario():
+        agent, model, _ = _orchestrator()
+        request = ChatRequest(session_id='s1', message='dishwasher will not drain')
+        leader = asyncio.create_task(agent.run(request))
+        while model.calls == 0:
+            await asyncio.sleep(0.001)
+        waiter = asyncio.create_task(agent.run(request))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        message = await waiter
+        await flush_background_tasks()
+        return leader, message, model
+
+    leader, message, model = asyncio.run(scenario())
+
+    assert leader.cancelled()
+    assert message.content == 'answer 2'
+    assert model.calls == 2
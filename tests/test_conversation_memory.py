@@ -0,0 +1,70 @@
+import pytest
+
+from backend.agent import memory
+from backend.agent.memory import SUMMARY_REFRESH_MESSAGES, ConversationMemory
+
+
+@pytest.fixture(autouse=True)
+def _reset_memory_state(monkeypatch):
+    memory._history_cache.clear()
+    memory._summaries.clear()
+    # One token per character keeps budgets independent of the tokenizer in use.
+    monkeypatch.setattr(memory, 'token_len', len)
+    yield
+    memory._history_cache.clear()
+    memory._summaries.clear()
+
+
+def _messages(*contents):
+    return [{'role': 'user', 'content': content} for content in contents]
+
+
+def _payloads(*contents):
+    return [{'conversation_id': 's', 'role': 'assistant', 'content': content} for content in contents]
+
+
+def test_extend_cached_appends_and_trims_to_window():
+    store = ConversationMemory(window=3)
+    store._store_cached('s', _messages('one', 'two'))
+
+    store._extend_cached('s', _payloads('three', 'four'))
+
+    assert [item['content'] for item in store._fetch_cached('s')] == ['two', 'three', 'four']
+
+
+def test_extend_cached_skips_uncached_sessions():
+    store = ConversationMemory(window=3)
+
+    store._extend_cached('s', _payloads('three'))
+
+    assert store._fetch_cached('s') is None
+
+
+def test_fit_budget_drops_oldest_messages_first():
+    store = ConversationMemory(token_budget=10)
+    history = _messages('aaaaa', 'bbbbb', 'ccccc')
+
+    dropped, kept = store.fit_budget(history)
+
+    assert dropped == history[:1]
+    assert kept == history[1:]
+
+
+def test_fit_budget_keeps_everything_that_fits():
+    store = ConversationMemory(token_budget=100)
+    history = _messages('aaaaa', 'bbbbb')
+
+    assert store.fit_budget(history) == ([], history)
+
+
+def test_summary_refreshes_only_after_falling_behind():
+    store = ConversationMemory()
+    dropped = _messages('m0', 'm1')
+    assert store.needs_summary('s', dropped)
+
+    store.store_summary('s', 'summary', dropped)
+    assert not store.needs_summary('s', dropped)
+
+    newer = [f'n{index}' for index in range(SUMMARY_REFRESH_MESSAGES)]
+    assert not store.needs_summary('s', dropped + _messages(*newer[:-1]))
+    assert store.needs_summary('s', dropped + _messages(*newer))
@@ -0,0 +1,14 @@
+from backend.database.clients import DatabaseClients
+
+
+def test_force_reconnect_only_drops_the_failed_client():
+    clients = DatabaseClients()
+    failed, rebuilt = object(), object()
+    clients._supabase = rebuilt
+
+    # A stale failure report must not discard a client another thread just rebuilt.
+    clients.force_reconnect(failed)
+    assert clients._supabase is rebuilt
+
+    clients.force_reconnect(rebuilt)
+    assert clients._supabase is None
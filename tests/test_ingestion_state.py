@@ -0,0 +1,65 @@
+import json
+
+from backend.ingestion.state import COMPACT_FACTOR, StateTracker
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_legacy_snapshot_is_converted_to_log(tmp_path):
+    path = tmp_path / 'state.json'
+    path.write_text(json.dumps({'abc': {'status': 'completed', 'filename': 'a.pdf'}}))
+
+    tracker = StateTracker.load(path)
+
+    assert tracker.state == {'abc': {'status': 'completed', 'filename': 'a.pdf'}}
+    assert _lines(path) == [{'digest': 'abc', 'status': 'completed', 'filename': 'a.pdf'}]
+
+
+def test_torn_final_line_is_skipped_and_next_append_is_clean(tmp_path):
+    path = tmp_path / 'state.json'
+    path.write_text(
+        json.dumps({'digest': 'a', 'status': 'processing'}) + '\n'
+        + json.dumps({'digest': 'a', 'status': 'completed'}) + '\n'
+        + '{"digest": "b", "sta'
+    )
+
+    tracker = StateTracker.load(path)
+    assert tracker.state == {'a': {'status': 'completed'}}
+
+    tracker.mark('b', 'completed')
+    tracker.close()
+
+    assert StateTracker.load(path).state == {'a': {'status': 'completed'}, 'b': {'status': 'completed'}}
+
+
+def test_last_record_wins_and_oversized_log_is_compacted(tmp_path):
+    path = tmp_path / 'state.json'
+    records = COMPACT_FACTOR + 5
+    path.write_text(
+        ''.join(json.dumps({'digest': 'a', 'status': 'processing', 'n': n}) + '\n' for n in range(records))
+    )
+
+    tracker = StateTracker.load(path)
+
+    assert tracker.state == {'a': {'status': 'processing', 'n': records - 1}}
+    assert tracker.records == 1
+    assert len(_lines(path)) == 1
+
+
+def test_completed_unchanged_uses_path_index(tmp_path):
+    path = tmp_path / 'state.json'
+    tracker = StateTracker.load(path)
+    meta = {'path': '/pdfs/a.pdf', 'size': 10, 'mtime_ns': 20}
+
+    tracker.mark('a', 'processing', meta)
+    assert not tracker.completed_unchanged('/pdfs/a.pdf', 10, 20)
+
+    tracker.mark('a', 'completed', meta)
+    tracker.close()
+
+    reloaded = StateTracker.load(path)
+    assert reloaded.completed_unchanged('/pdfs/a.pdf', 10, 20)
+    assert not reloaded.completed_unchanged('/pdfs/a.pdf', 10, 21)
+    assert not reloaded.completed_unchanged('/pdfs/b.pdf', 10, 20)
@@ -0,0 +1,63 @@
+import numpy as np
+
+from backend.agent.cache import SemanticCache
+from backend.app.models import ChatMessage
+
+
+def _unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _answer(content):
+    return ChatMessage(role='assistant', content=content)
+
+
+def test_lookup_respects_threshold():
+    cache = SemanticCache(embedder=None, threshold=0.9)
+    cache.store('s1', _unit(1, 0, 0), _answer('cached'))
+
+    assert cache.lookup('s1', _unit(1, 0.1, 0)).content == 'cached'
+    assert cache.lookup('s1', _unit(1, 1, 0)) is None
+
+
+def test_buckets_are_isolated():
+    cache = SemanticCache(embedder=None, threshold=0.9)
+    cache.store('s1', _unit(1, 0, 0), _answer('session one'))
+
+    assert cache.lookup('s2', _unit(1, 0, 0)) is None
+    assert cache.lookup('s1', _unit(1, 0, 0)).content == 'session one'
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(embedder=None, threshold=0.9, max_entries=2)
+    cache.store('s1', _unit(1, 0, 0), _answer('a'))
+    cache.store('s1', _unit(0, 1, 0), _answer('b'))
+    # Touch "a" so "b" becomes the oldest entry.
+    assert cache.lookup('s1', _unit(1, 0, 0)).content == 'a'
+
+    cache.store('s2', _unit(0, 0, 1), _answer('c'))
+
+    assert cache.lookup('s1', _unit(0, 1, 0)) is None
+    assert cache.lookup('s1', _unit(1, 0, 0)).content == 'a'
+    assert cache.lookup('s2', _unit(0, 0, 1)).content == 'c'
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        return [[3.0, 4.0, 0.0] for _ in texts]
+
+
+def test_embed_accepts_any_embedder_and_normalizes():
+    embedder = CountingEmbedder()
+    cache = SemanticCache(embedder=embedder, threshold=0.9)
+
+    embedding = cache.embed('dishwasher will not drain')
+
+    assert embedder.calls == 1
+    assert embedding.dtype == np.float32
+    assert np.allclose(embedding, [0.6, 0.8, 0.0])
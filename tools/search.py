@@ -1,11 +1,16 @@
 """Web search integration for Google Custom Search and Bing."""
 from __future__ import annotations
 
+import asyncio
+import logging
+
 import httpx
 from pydantic import BaseModel
 
 from backend.app.config import settings
 
+logger = logging.getLogger(__name__)
+
 
 class SearchResult(BaseModel):
     title: str
@@ -16,12 +21,30 @@ class SearchResult(BaseModel):
 
 class SearchTool:
     def __init__(self) -> None:
-        self._client = httpx.AsyncClient(timeout=10)
+        # Limits and HTTP/2 live on the transport; httpx ignores them on the client once one is passed.
+        self._client = httpx.AsyncClient(
+            timeout=10,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                retries=1,
+            ),
+        )
 
     async def search(self, query: str) -> list[SearchResult]:
-        google_results = await self._google_search(query)
-        bing_results = await self._bing_search(query)
-        return google_results + bing_results
+        # Providers are independent; query both at once and keep whichever succeeds.
+        results = await asyncio.gather(
+            self._google_search(query),
+            self._bing_search(query),
+            return_exceptions=True,
+        )
+        combined: list[SearchResult] = []
+        for provider, outcome in zip(("google", "bing"), results):
+            if isinstance(outcome, BaseException):
+                logger.warning("%s search failed: %s", provider, outcome)
+                continue
+            combined.extend(outcome)
+        return combined
 
     async def _google_search(self, query: str) -> list[SearchResult]:
         if not settings.google_search_api_key or not settings.google_search_cx:
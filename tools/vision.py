@@ -1,6 +1,7 @@
 """Vision tool for image understanding via Gemini 2.5 Flash."""
 from __future__ import annotations
 
+import asyncio
 from typing import List
 
 import httpx
@@ -10,15 +11,26 @@ from backend.app.config import settings
 
 class VisionTool:
     def __init__(self) -> None:
-        self._client = httpx.AsyncClient(timeout=30)
+        self._client = httpx.AsyncClient(
+            timeout=30,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                retries=1,
+            ),
+        )
         self._api_url = "https://generativelanguage.googleapis.com/v1beta/models"
         self._model = "gemini-2.5-flash"
+        # Shared across calls so concurrent requests together respect Gemini QPS limits.
+        self._semaphore = asyncio.Semaphore(8)
 
     async def describe_images(self, image_ids: List[str]) -> List[dict]:
         if not settings.gemini_api_key:
             return []
-        responses: List[dict] = []
-        for image_id in image_ids:
+        return list(await asyncio.gather(*(self._describe(image_id) for image_id in image_ids)))
+
+    async def _describe(self, image_id: str) -> dict:
+        async with self._semaphore:
             resp = await self._client.post(
                 f"{self._api_url}/{self._model}:generateContent",
                 params={"key": settings.gemini_api_key},
@@ -34,5 +46,4 @@ class VisionTool:
                 },
             )
             resp.raise_for_status()
-            responses.append(resp.json())
-        return responses
+            return resp.json()